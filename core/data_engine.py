@@ -3,19 +3,28 @@ PyTacView核心数据引擎
 管理实体和轨迹数据
 """
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from core.spatial_index import SpatialGrid
+
+# 朝向量化参数：弧度角折算到[-π, π)后按int16定点存储，-32768表示缺失
+_ANGLE_SCALE = 32767 / np.pi
+_ANGLE_MISSING = np.iinfo(np.int16).min
 
 class Entity:
     """
     表示战术视图中的单个实体（如飞机、舰船等）
+
+    轨迹数据按列存储（SoA）：times为相对参考时间的秒数（float64），
+    positions为N×3的float32数组，orientations/velocities为N×3数组或None。
+    朝向在内部以int16定点数存储（精度约0.0055°），读取时还原为float32弧度。
+    数组按容量两倍增长，前_count行为有效数据。
     """
     def __init__(self, id, name, type_name=None, coalition=None):
         self.id = id                # 实体唯一标识符
         self.name = name            # 实体名称
         self.type_name = type_name  # 实体类型（如F-16, MiG-29等）
         self.coalition = coalition  # 所属阵营（如红方、蓝方）
-        self.trajectory = []        # 轨迹点列表
-        self.timestamps = []        # 对应的时间戳
         self.visible = True         # 是否可见
         self.color = None           # 实体颜色
 
@@ -24,52 +33,256 @@ class Entity:
         self.is_missile = False     # 是否为导弹
         self.is_explosion = False   # 是否为爆炸效果
         self.radius = 100           # 爆炸半径（用于爆炸效果）
+        self.revision = 0           # 轨迹版本号，每次添加轨迹点时递增
+
+        # 轨迹数组（连续存储，容量不小于_count）
+        self._count = 0
+        self._times = np.empty(0, dtype=np.float64)
+        self._positions = np.empty((0, 3), dtype=np.float32)
+        self._orientations = None
+        self._velocities = None
+
+        # 尚未合并到数组中的新增轨迹点
+        self._pending_times = []
+        self._pending_positions = []
+        self._pending_orientations = []
+        self._pending_velocities = []
 
     def add_point(self, timestamp, position, orientation=None, velocity=None):
         """
         添加一个轨迹点
 
         参数:
-        timestamp: 时间戳（datetime对象）
+        timestamp: 时间（相对参考时间的秒数）
         position: 位置坐标 [x, y, z]
         orientation: 朝向 [pitch, yaw, roll]（可选）
         velocity: 速度矢量 [vx, vy, vz]（可选）
         """
-        self.timestamps.append(timestamp)
-        point = {
-            'position': np.array(position, dtype=np.float32),
-            'orientation': np.array(orientation, dtype=np.float32) if orientation else None,
-            'velocity': np.array(velocity, dtype=np.float32) if velocity else None
-        }
-        self.trajectory.append(point)
+        self.revision += 1
+        self._pending_times.append(timestamp)
+        self._pending_positions.append(position)
+        self._pending_orientations.append(orientation)
+        self._pending_velocities.append(velocity)
+
+    def add_points(self, timestamps, positions, orientations=None, velocities=None):
+        """
+        批量添加轨迹点
+
+        参数:
+        timestamps: 时间数组（相对参考时间的秒数）
+        positions: N×3位置数组
+        orientations: N×3朝向数组（可选，缺失的值为NaN）
+        velocities: N×3速度数组（可选，缺失的值为NaN）
+        """
+        self.revision += 1
+        self.finalize()
+        self._store(timestamps, positions, orientations, velocities)
+
+    def finalize(self):
+        """
+        将新增的轨迹点一次性合并到连续数组中
+
+        由DataEngine.add_entity在实体加入时调用；之后如有新增点，
+        在下次访问轨迹数组时会自动再次合并
+        """
+        if not self._pending_times:
+            return
+
+        self._store(self._pending_times, self._pending_positions,
+                    self._pending_orientations, self._pending_velocities)
+
+        self._pending_times = []
+        self._pending_positions = []
+        self._pending_orientations = []
+        self._pending_velocities = []
+
+    def _store(self, timestamps, positions, orientations, velocities):
+        """将轨迹点写入数组末尾（容量不足时按两倍扩容）"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        count = self._count
+        added = len(timestamps)
+        self._reserve(count + added)
+
+        self._times[count:count + added] = timestamps
+        self._positions[count:count + added] = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        capacity = len(self._times)
+        self._orientations = _append_orientations(self._orientations, orientations,
+                                                  count, added, capacity)
+        self._velocities = _append_optional(self._velocities, velocities,
+                                            count, added, capacity)
+        self._count = count + added
+
+    def _reserve(self, total):
+        """确保数组容量不小于total"""
+        capacity = len(self._times)
+        if total <= capacity:
+            return
+
+        capacity = max(total, capacity * 2, 16)
+        self._times = _grow(self._times, capacity, 0.0)
+        self._positions = _grow(self._positions, capacity, 0.0)
+        if self._orientations is not None:
+            self._orientations = _grow(self._orientations, capacity, _ANGLE_MISSING)
+        if self._velocities is not None:
+            self._velocities = _grow(self._velocities, capacity, np.nan)
+
+    @property
+    def n_points(self):
+        """轨迹点数量"""
+        return self._count + len(self._pending_times)
+
+    @property
+    def times(self):
+        """轨迹点时间数组（秒）"""
+        self.finalize()
+        return self._times[:self._count]
+
+    @property
+    def positions(self):
+        """轨迹点位置数组（N×3）"""
+        self.finalize()
+        return self._positions[:self._count]
+
+    @property
+    def orientations(self):
+        """轨迹点朝向数组（N×3，弧度，缺失的值为NaN），无朝向数据时为None"""
+        self.finalize()
+        if self._orientations is None:
+            return None
+
+        # 由int16定点数还原为弧度
+        quantized = self._orientations[:self._count]
+        result = quantized.astype(np.float32) / np.float32(_ANGLE_SCALE)
+        result[quantized == _ANGLE_MISSING] = np.nan
+        return result
+
+    @property
+    def velocities(self):
+        """轨迹点速度数组（N×3），无速度数据时为None"""
+        self.finalize()
+        if self._velocities is None:
+            return None
+        return self._velocities[:self._count]
+
+    @property
+    def timestamps(self):
+        """times的别名"""
+        return self.times
+
+    @property
+    def trajectory(self):
+        """positions的别名"""
+        return self.positions
 
     def get_position_at(self, timestamp):
         """
         获取指定时间的位置（使用线性插值）
+
+        参数:
+        timestamp: 时间（相对参考时间的秒数）
         """
-        if not self.trajectory:
+        times = self.times
+        if len(times) == 0:
             return None
+        positions = self._positions
 
         # 如果时间戳小于第一个点或大于最后一个点，则返回最近的点
-        if timestamp < self.timestamps[0]:
+        if timestamp < times[0]:
+            return None
+        if timestamp >= times[-1]:
+            return positions[len(times) - 1]
+
+        # 二分查找时间戳所在区间：times[i-1] <= timestamp < times[i]
+        i = int(np.searchsorted(times, timestamp, side='right'))
+        t1, t2 = times[i - 1], times[i]
+        p1, p2 = positions[i - 1], positions[i]
+
+        # 计算插值因子
+        factor = float((timestamp - t1) / (t2 - t1))
+
+        # 线性插值计算位置
+        return p1 + factor * (p2 - p1)
+
+    def get_positions_at(self, timestamps):
+        """
+        批量获取多个时间的位置（使用线性插值）
+
+        参数:
+        timestamps: 时间数组（相对参考时间的秒数）
+
+        返回:
+        K×3的位置数组，超出轨迹时间范围的时间取最近端点的位置
+        """
+        times = self.times
+        if len(times) == 0:
             return None
-        if timestamp > self.timestamps[-1]:
-            return self.trajectory[-1]['position']
 
-        # 找到时间戳之间的两个点
-        for i in range(len(self.timestamps) - 1):
-            if self.timestamps[i] <= timestamp <= self.timestamps[i+1]:
-                # 线性插值
-                t1, t2 = self.timestamps[i], self.timestamps[i+1]
-                p1, p2 = self.trajectory[i]['position'], self.trajectory[i+1]['position']
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        result = np.empty((len(timestamps), 3), dtype=np.float32)
+        for axis in range(3):
+            result[:, axis] = np.interp(timestamps, times, self._positions[:len(times), axis])
+        return result
 
-                # 计算插值因子
-                factor = (timestamp - t1).total_seconds() / (t2 - t1).total_seconds()
 
-                # 线性插值计算位置
-                return p1 + factor * (p2 - p1)
+def _grow(array, capacity, fill):
+    """将数组扩容到capacity行，新增行以fill填充"""
+    result = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+    result[:len(array)] = array
+    return result
 
-        return None
+
+def _append_optional(array, values, count, added, capacity):
+    """
+    将可选属性（朝向、速度）写入N×3数组第count行起，缺失的值以NaN填充
+
+    参数:
+    array: 已有数组（可能为None，未写入的行均为NaN）
+    values: 新增值，可以为N×3数组、元素可为None的列表或None
+    count: 已有轨迹点数量
+    added: 新增轨迹点数量
+    capacity: 数组容量（创建新数组时使用）
+    """
+    if isinstance(values, list) and all(v is None for v in values):
+        values = None
+    if values is None:
+        return array
+
+    if array is None:
+        array = np.full((capacity, 3), np.nan, dtype=np.float32)
+    if isinstance(values, list):
+        for i, value in enumerate(values):
+            if value is not None:
+                array[count + i] = value
+    else:
+        array[count:count + added] = values
+    return array
+
+
+def _append_orientations(array, values, count, added, capacity):
+    """
+    将朝向（弧度）量化为int16后写入N×3数组第count行起
+
+    参数:
+    array: 已有的int16数组（可能为None，未写入的行均为缺失值）
+    values: 新增朝向，格式同_append_optional
+    count: 已有轨迹点数量
+    added: 新增轨迹点数量
+    capacity: 数组容量（创建新数组时使用）
+    """
+    values = _append_optional(None, values, 0, added, added)
+    if values is None:
+        return array
+
+    # 折算到[-π, π)后按定点数取整，NaN记为缺失
+    wrapped = np.remainder(values + np.pi, 2 * np.pi) - np.pi
+    quantized = np.full((added, 3), _ANGLE_MISSING, dtype=np.int16)
+    valid = ~np.isnan(wrapped)
+    quantized[valid] = np.rint(wrapped[valid] * _ANGLE_SCALE).astype(np.int16)
+
+    if array is None:
+        array = np.full((capacity, 3), _ANGLE_MISSING, dtype=np.int16)
+    array[count:count + added] = quantized
+    return array
 
 
 class DataEngine:
@@ -78,19 +291,84 @@ class DataEngine:
     """
     def __init__(self):
         self.entities = {}          # 实体字典，键为ID
-        self.start_time = None      # 仿真开始时间
+        self.start_time = None      # 仿真开始时间（相对参考时间的秒数，下同）
         self.end_time = None        # 仿真结束时间
         self.current_time = None    # 当前仿真时间
+        self.reference_time = None  # 参考时间（实体轨迹时间均相对于此）
         self.reference_point = np.array([0, 0, 0], dtype=np.float32)  # 参考点坐标
 
+        # 所有实体轨迹的打包数组（实体集合变化时由pack_trajectories重建）
+        self._generation = 0        # 数据版本号，增删实体或已加入的实体新增轨迹点时递增
+        self._revision = 0          # 已加入实体的轨迹版本号之和
+        self.packed_generation = -1  # 打包数组对应的版本号
+        self.all_times = None       # 拼接后的时间数组
+        self.all_positions = None   # 拼接后的位置数组（N×3，float32）
+        self.entity_slices = {}     # 实体ID到其在拼接数组中切片的映射
+        self._packed_entities = []  # 参与打包的实体列表
+        self._packed_index = {}     # 实体ID到其打包序号的映射
+        self._packed_keys = None    # 用于全局二分查找的组合键
+        self._packed_starts = None  # 每个实体在拼接数组中的起始下标
+        self._packed_lengths = None  # 每个实体的轨迹点数量
+        self._packed_t_min = 0.0
+        self._packed_stride = 1.0
+
+        # 最近一次查询结果缓存，键为(时间, 版本号)
+        self._frame_cache_key = None
+        self._frame_cache = None
+
+        # 当前帧实体位置的空间索引，键与查询结果缓存相同
+        self._spatial_key = None
+        self._spatial_index = None
+        self._spatial_ids = []
+
     def add_entity(self, entity):
         """添加一个实体"""
+        entity.finalize()
+        if entity.id in self.entities:
+            self._revision -= self.entities[entity.id].revision
         self.entities[entity.id] = entity
+        self._revision += entity.revision
+        self._generation += 1
 
         # 更新仿真时间范围
-        if entity.timestamps:
-            first_time = entity.timestamps[0]
-            last_time = entity.timestamps[-1]
+        if entity.n_points:
+            first_time = float(entity.times[0])
+            last_time = float(entity.times[-1])
+
+            if self.start_time is None or first_time < self.start_time:
+                self.start_time = first_time
+
+            if self.end_time is None or last_time > self.end_time:
+                self.end_time = last_time
+
+        # 设置当前时间为开始时间（如果未设置）
+        if self.current_time is None and self.start_time is not None:
+            self.current_time = self.start_time
+
+    def add_entities(self, entities):
+        """
+        批量添加实体
+
+        参数:
+        entities: 实体的可迭代对象
+        """
+        entities = list(entities)
+        if not entities:
+            return
+
+        for entity in entities:
+            entity.finalize()
+            if entity.id in self.entities:
+                self._revision -= self.entities[entity.id].revision
+            self.entities[entity.id] = entity
+            self._revision += entity.revision
+        self._generation += 1
+
+        # 一次性计算所有实体的时间范围
+        timed = [entity for entity in entities if entity.n_points]
+        if timed:
+            first_time = float(np.fromiter((e.times[0] for e in timed), dtype=np.float64, count=len(timed)).min())
+            last_time = float(np.fromiter((e.times[-1] for e in timed), dtype=np.float64, count=len(timed)).max())
 
             if self.start_time is None or first_time < self.start_time:
                 self.start_time = first_time
@@ -105,7 +383,8 @@ class DataEngine:
     def remove_entity(self, entity_id):
         """移除一个实体"""
         if entity_id in self.entities:
-            del self.entities[entity_id]
+            self._revision -= self.entities.pop(entity_id).revision
+            self._generation += 1
 
             # 重新计算时间范围
             self._recalculate_time_range()
@@ -116,11 +395,11 @@ class DataEngine:
         self.end_time = None
 
         for entity in self.entities.values():
-            if not entity.timestamps:
+            if not entity.n_points:
                 continue
 
-            first_time = entity.timestamps[0]
-            last_time = entity.timestamps[-1]
+            first_time = float(entity.times[0])
+            last_time = float(entity.times[-1])
 
             if self.start_time is None or first_time < self.start_time:
                 self.start_time = first_time
@@ -128,10 +407,73 @@ class DataEngine:
             if self.end_time is None or last_time > self.end_time:
                 self.end_time = last_time
 
+    def _check_revisions(self):
+        """实体加入后又添加了轨迹点时，更新版本号和时间范围"""
+        revision = sum(entity.revision for entity in self.entities.values())
+        if revision == self._revision:
+            return
+
+        self._revision = revision
+        self._generation += 1
+        self._recalculate_time_range()
+        if self.current_time is None and self.start_time is not None:
+            self.current_time = self.start_time
+
+    def pack_trajectories(self):
+        """
+        将所有实体的轨迹拼接为连续数组
+
+        结果保存在all_times、all_positions和entity_slices中，
+        可直接作为一个顶点缓冲上传到GPU。
+
+        每个点的组合键为 实体序号*stride + (时间-t_min)，stride大于总时长，
+        使得各实体的轨迹在键空间中互不重叠且按时间有序，
+        从而可以用一次np.searchsorted查找所有实体的插值区间。
+        """
+        self._check_revisions()
+        if self.packed_generation == self._generation:
+            return
+
+        entities = [entity for entity in self.entities.values() if entity.n_points]
+        self._packed_entities = entities
+        self._packed_index = {entity.id: k for k, entity in enumerate(entities)}
+        self.packed_generation = self._generation
+
+        if not entities:
+            self.all_times = None
+            self.all_positions = None
+            self.entity_slices = {}
+            return
+
+        lengths = np.array([entity.n_points for entity in entities], dtype=np.int64)
+        times = np.concatenate([entity.times for entity in entities])
+        positions = np.concatenate([entity.positions for entity in entities])
+
+        t_min = times.min()
+        stride = times.max() - t_min + 1.0
+        owners = np.repeat(np.arange(len(entities), dtype=np.float64), lengths)
+
+        starts = np.cumsum(lengths) - lengths
+
+        self.all_times = times
+        self.all_positions = positions
+        self.entity_slices = {
+            entity.id: slice(int(start), int(start + length))
+            for entity, start, length in zip(entities, starts, lengths)
+        }
+        self._packed_keys = owners * stride + (times - t_min)
+        self._packed_starts = starts
+        self._packed_lengths = lengths
+        self._packed_t_min = t_min
+        self._packed_stride = stride
+
     def get_entities_at_time(self, timestamp=None):
         """
         获取指定时间的所有实体位置
         如果未指定时间，则使用当前时间
+
+        参数:
+        timestamp: 时间（相对参考时间的秒数）
         """
         if timestamp is None:
             timestamp = self.current_time
@@ -139,29 +481,149 @@ class DataEngine:
         if timestamp is None:
             return {}
 
-        result = {}
-        for entity_id, entity in self.entities.items():
-            if not entity.visible:
-                continue
+        # 暂停时连续多帧查询同一时间，直接返回缓存结果
+        self._check_revisions()
+        cache_key = (timestamp, self._generation)
+        if cache_key == self._frame_cache_key:
+            return self._frame_cache
 
-            position = entity.get_position_at(timestamp)
-            if position is not None:
-                result[entity_id] = {
+        self.pack_trajectories()
+
+        result = {}
+        if self.all_times is not None:
+            times = self.all_times
+            positions = self.all_positions
+            starts = self._packed_starts
+            ends = starts + self._packed_lengths
+
+            # 查询键限制在(-1, stride)内，保证不会落入相邻实体的键区间
+            offset = min(max(timestamp - self._packed_t_min, -0.5), self._packed_stride - 0.5)
+            queries = np.arange(len(starts), dtype=np.float64) * self._packed_stride + offset
+            idx = np.searchsorted(self._packed_keys, queries, side='right')
+
+            # idx为时间不大于查询时间的点数，等于起始下标说明实体尚未出现
+            present = idx > starts
+            lo = np.maximum(idx - 1, starts)
+            hi = np.minimum(idx, ends - 1)
+
+            # 计算插值因子（超过最后一个点时lo==hi，取最后位置）
+            dt = times[hi] - times[lo]
+            factor = np.zeros(len(starts), dtype=np.float32)
+            valid = dt > 0
+            factor[valid] = (timestamp - times[lo[valid]]) / dt[valid]
+
+            # 线性插值计算所有实体的位置
+            p1 = positions[lo]
+            current = p1 + factor[:, None] * (positions[hi] - p1)
+
+            for k in np.flatnonzero(present):
+                entity = self._packed_entities[k]
+                if not entity.visible:
+                    continue
+
+                result[entity.id] = {
                     'entity': entity,
-                    'position': position
+                    'position': current[k]
                 }
 
+        self._frame_cache_key = cache_key
+        self._frame_cache = result
         return result
 
+    def get_trails(self, entities, start_time, end_time):
+        """
+        批量计算多个实体在时间窗口内的轨迹（所有实体共用一次二分查找）
+
+        参数:
+        entities: 实体列表
+        start_time: 轨迹起始时间
+        end_time: 轨迹结束时间（通常为当前时间）
+
+        返回:
+        (valid, first, last, head, tail, head_time)：valid为各实体是否有足够轨迹点的布尔数组；
+        其余数组只包含有效实体：first/last为窗口内首末轨迹点在打包数组中的下标，
+        head/tail为窗口起点和终点的插值位置，head_time为起点对应的时间
+        """
+        self.pack_trajectories()
+
+        count = len(entities)
+        if self.all_times is None or not count:
+            empty = np.empty(0, dtype=np.int64)
+            return (np.zeros(count, dtype=bool), empty, empty,
+                    np.empty((0, 3)), np.empty((0, 3)), np.empty(0))
+
+        times = self.all_times
+        positions = self.all_positions
+        ordinals = np.fromiter((self._packed_index[entity.id] for entity in entities),
+                               dtype=np.int64, count=count)
+        starts = self._packed_starts[ordinals]
+        lengths = self._packed_lengths[ordinals]
+        base = ordinals * self._packed_stride
+
+        def points_until(timestamp):
+            """各实体时间不大于timestamp的轨迹点数量"""
+            offset = min(max(timestamp - self._packed_t_min, -0.5), self._packed_stride - 0.5)
+            return np.searchsorted(self._packed_keys, base + offset, side='right') - starts
+
+        # 当前点为最后一个不晚于结束时间的点，起始点为第一个晚于起始时间的点
+        current = points_until(end_time) - 1
+        begin = np.minimum(points_until(start_time), current + 1)
+        valid = (current >= 1) & (begin < current)
+
+        starts, lengths = starts[valid], lengths[valid]
+        current, begin = current[valid], begin[valid]
+
+        # 两端所在区间的下标已知，一次向量插值（区间限制在轨迹范围内）
+        head_time = np.maximum(start_time, times[starts])
+        query = np.stack((head_time, np.full(len(starts), float(end_time))))
+        lower = np.clip(np.stack((begin - 1, current)), 0, lengths - 2) + starts
+        t1 = times[lower]
+        dt = times[lower + 1] - t1
+        factor = np.clip(np.divide(query - t1, dt, out=np.ones_like(dt), where=dt > 0), 0.0, 1.0)
+        p1 = positions[lower].astype(np.float64)
+        head, tail = p1 + factor[..., None] * (positions[lower + 1] - p1)
+
+        return valid, starts + begin, starts + current, head, tail, head_time
+
+    def query_radius(self, center, radius, timestamp=None):
+        """
+        查询指定时间某点附近的实体
+
+        参数:
+        center: 查询中心 [x, y, z]
+        radius: 查询半径（米）
+        timestamp: 查询时间，默认为当前时间
+
+        返回:
+        半径内实体的ID列表
+        """
+        current_entities = self.get_entities_at_time(timestamp)
+        if not current_entities:
+            return []
+
+        # 空间索引随帧缓存一起失效
+        if self._spatial_key != self._frame_cache_key:
+            self._spatial_ids = list(current_entities)
+            positions = [data['position'] for data in current_entities.values()]
+            self._spatial_index = SpatialGrid(np.array(positions).reshape(-1, 3))
+            self._spatial_key = self._frame_cache_key
+
+        return [self._spatial_ids[i] for i in self._spatial_index.query_radius(center, radius)]
+
+    def seconds_to_time(self, seconds):
+        """将相对参考时间的秒数转换为datetime（仅用于显示）"""
+        return self.reference_time + timedelta(seconds=float(seconds))
+
     def set_time(self, timestamp):
         """设置当前时间"""
         self.current_time = timestamp
 
     def advance_time(self, seconds):
         """向前推进时间（秒）"""
-        if self.current_time:
-            self.current_time += timedelta(seconds=seconds)
+        if self.current_time is not None:
+            self.current_time += seconds
 
     def get_time_range(self):
         """获取时间范围（开始时间和结束时间）"""
+        self._check_revisions()
         return self.start_time, self.end_time
\ No newline at end of file
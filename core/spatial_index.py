@@ -0,0 +1,82 @@
+"""
+空间索引
+基于均匀三维网格的近邻查询
+"""
+import numpy as np
+
+# 网格坐标编码参数：每个轴占21位，偏移后保证为非负数
+_CELL_BITS = 21
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+
+
+class SpatialGrid:
+    """
+    均匀三维网格空间索引
+
+    按单元格对点排序，查询时只检查查询球包围盒覆盖的单元格
+    """
+    def __init__(self, positions, cell_size=10000.0):
+        """
+        构建空间索引
+
+        参数:
+        positions: N×3位置数组
+        cell_size: 网格单元格边长（米）
+        """
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+
+        # 按单元格编码排序，同一单元格内的点在数组中连续
+        keys = self._encode(np.floor(self.positions / self.cell_size).astype(np.int64))
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    @staticmethod
+    def _encode(cells):
+        """将三维单元格坐标编码为单个整数"""
+        cells = cells + _CELL_OFFSET
+        return (cells[..., 0] << (2 * _CELL_BITS)) | (cells[..., 1] << _CELL_BITS) | cells[..., 2]
+
+    def __len__(self):
+        """索引中的点数"""
+        return len(self.positions)
+
+    def query_radius(self, center, radius):
+        """
+        查询指定半径内的点
+
+        参数:
+        center: 查询中心 [x, y, z]
+        radius: 查询半径（米）
+
+        返回:
+        半径内点的下标数组
+        """
+        if len(self.positions) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        center = np.asarray(center, dtype=np.float64)
+        lo = np.floor((center - radius) / self.cell_size).astype(np.int64)
+        hi = np.floor((center + radius) / self.cell_size).astype(np.int64)
+
+        # 覆盖的单元格数多于点数时，直接检查所有点
+        if np.prod(hi - lo + 1) > len(self.positions):
+            candidates = np.arange(len(self.positions))
+        else:
+            axes = [np.arange(lo[i], hi[i] + 1) for i in range(3)]
+            cells = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+            keys = self._encode(cells)
+
+            left = np.searchsorted(self._keys, keys, side='left')
+            right = np.searchsorted(self._keys, keys, side='right')
+            hit = right > left
+            if not hit.any():
+                return np.empty(0, dtype=np.int64)
+
+            candidates = np.concatenate(
+                [self._order[l:r] for l, r in zip(left[hit], right[hit])])
+
+        # 精确距离过滤
+        offsets = self.positions[candidates] - center
+        inside = np.einsum('ij,ij->i', offsets, offsets) <= radius * radius
+        return np.sort(candidates[inside])
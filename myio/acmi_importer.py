@@ -2,9 +2,11 @@
 ACMI文件导入器 - 简化版
 用于读取和解析ACMI格式文件
 """
+import itertools
+import logging
 import math
-import re
-from datetime import datetime, timedelta
+import multiprocessing
+from datetime import datetime
 import numpy as np
 import os
 
@@ -12,6 +14,21 @@ import pymap3d
 
 from core.data_engine import Entity, DataEngine
 
+logger = logging.getLogger(__name__)
+
+# 颜色名称到RGB值的映射
+_COLOR_LUT = {
+    'red': (1.0, 0.0, 0.0),    # 红色
+    'blue': (0.0, 0.0, 1.0),   # 蓝色
+    'green': (0.0, 1.0, 0.0),  # 绿色
+}
+_DEFAULT_COLOR = (0.7, 0.7, 0.7)  # 默认灰色
+
+# 数据部分按时间戳行切分为块，每块约包含的行数
+_CHUNK_LINES = 50000
+# 文件大小超过该值（字节）时使用多进程并行解析
+_PARALLEL_MIN_BYTES = 32 << 20
+
 class ACMIImporter:
     """
     ACMI文件导入器
@@ -23,6 +40,22 @@ class ACMIImporter:
         self.reference_lon_deg = 120.0
         self.reference_lat_deg = 60.0
         self.reference_alt_m = 0.0
+
+        # 参考点的ECEF坐标及经纬度三角函数（坐标转换时复用）
+        ref_lat_rad = math.radians(self.reference_lat_deg)
+        ref_lon_rad = math.radians(self.reference_lon_deg)
+        self._sin_ref_lat = math.sin(ref_lat_rad)
+        self._cos_ref_lat = math.cos(ref_lat_rad)
+        self._sin_ref_lon = math.sin(ref_lon_rad)
+        self._cos_ref_lon = math.cos(ref_lon_rad)
+        self._ref_ecef = pymap3d.geodetic2ecef(self.reference_lat_deg,
+                                               self.reference_lon_deg,
+                                               self.reference_alt_m)
+
+        # 解析过程中暂存的原始轨迹采样（按数据块），解析结束后统一转换坐标
+        self._sample_ids = []   # 采样所属实体ID数组
+        self._samples = []      # N×7数组：(时间, 经度, 纬度, 高度, 俯仰, 偏航, 滚转)
+
     def import_file(self, filepath):
         """
         导入ACMI文件
@@ -34,66 +67,73 @@ class ACMIImporter:
         bool: 是否成功导入
         """
         if not os.path.exists(filepath):
-            print(f"错误：文件 {filepath} 不存在")
+            logger.error("文件 %s 不存在", filepath)
             return False
 
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # 解析文件头
-            if not self._parse_header(lines):
-                print("错误：文件头解析失败")
-                return False
-
-            # 解析数据部分
-            self._parse_data(lines)
+            # 单次流式读取：文件头与数据部分共用同一个文件迭代器
+            # utf-8-sig编码会自动去除文件开头的BOM标记
+            with open(filepath, 'r', encoding='utf-8-sig', buffering=1 << 20) as f:
+                # 解析文件头
+                first_frame = self._parse_header(f)
+                if first_frame is None:
+                    logger.error("文件头解析失败")
+                    return False
+                if self.reference_time is None:
+                    logger.error("文件头缺少参考时间(ReferenceTime)")
+                    return False
+
+                # 实体轨迹时间均相对于参考时间存储
+                self.data_engine.reference_time = self.reference_time
+
+                # 解析数据部分（大文件使用多进程）
+                parallel = os.path.getsize(filepath) >= _PARALLEL_MIN_BYTES
+                self._parse_data(f, first_frame, parallel)
 
             return True
 
         except Exception as e:
-            print(f"导入文件时出错: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("导入文件时出错: %s", e)
             return False
 
-    def _parse_header(self, lines):
-        """解析ACMI文件头部"""
-        # 检查文件格式版本
-        if len(lines) == 0:
-            print("错误：文件为空")
-            return False
+    def _parse_header(self, f):
+        """
+        解析ACMI文件头部
 
-        file_type_line = lines[0].strip()
-        # 添加调试信息
-        print(f"首行内容: '{file_type_line}'")
-        print(f"首行字符编码: {[ord(c) for c in file_type_line]}")
+        从文件迭代器中逐行读取，直到遇到第一个时间戳行（以#开头）为止
 
-        # 检查是否有BOM或其他前缀
-        if file_type_line.startswith("\ufeff"):
-            print("检测到BOM标记，正在移除...")
-            file_type_line = file_type_line.replace("\ufeff", "")
+        返回:
+        第一个时间戳行；解析失败时返回None
+        """
+        # 检查文件格式版本
+        file_type_line = f.readline()
+        if not file_type_line:
+            logger.error("文件为空")
+            return None
+
+        file_type_line = file_type_line.strip()
+        logger.debug("首行内容: '%s'", file_type_line)
 
         # 检查是否有前导空格
         if file_type_line and not file_type_line.startswith("FileType="):
             # 尝试查找FileType=
             if "FileType=" in file_type_line:
                 index = file_type_line.find("FileType=")
-                print(f"FileType=在位置{index}处找到，前面的字符是: '{file_type_line[:index]}'")
+                logger.debug("FileType=在位置%d处找到，前面的字符是: '%s'", index, file_type_line[:index])
                 # 调整起始位置
                 file_type_line = file_type_line[index:]
-                print(f"调整后的首行: '{file_type_line}'")
+                logger.debug("调整后的首行: '%s'", file_type_line)
 
         if not file_type_line.startswith("FileType="):
-            print(f"错误：不是以FileType=开头 ('{file_type_line}')")
-            return False
+            logger.error("不是以FileType=开头 ('%s')", file_type_line)
+            return None
 
         if "acmi" not in file_type_line.lower():
-            print(f"不支持的文件类型: {file_type_line}")
-            return False
+            logger.error("不支持的文件类型: %s", file_type_line)
+            return None
 
         # 解析参考时间
-        for line in lines:
+        for line in f:
             line = line.strip()
 
             # 参考时间
@@ -107,178 +147,285 @@ class ACMIImporter:
                 try:
                     # 解析ISO格式时间
                     self.reference_time = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-                    print(f"找到参考时间: {self.reference_time}")
+                    logger.debug("找到参考时间: %s", self.reference_time)
                 except ValueError:
                     try:
                         # 尝试解析其他格式
                         self.reference_time = datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%SZ")
-                        print(f"找到参考时间(备选格式): {self.reference_time}")
+                        logger.debug("找到参考时间(备选格式): %s", self.reference_time)
                     except ValueError:
-                        print(f"无法解析参考时间: {time_str}")
-                        return False
+                        logger.error("无法解析参考时间: %s", time_str)
+                        return None
 
             # 开始找到数据部分（以#开头的行）
             if line.startswith("#"):
-                return True
+                return line
 
-        return False
+        return None
 
-    def _parse_data(self, lines):
-        """解析ACMI数据部分"""
-        current_entities = {}  # 当前活跃的实体，键为ID
-        current_time = None    # 当前时间戳
+    def _parse_data(self, f, first_frame, parallel=False):
+        """
+        解析ACMI数据部分
 
-        # 跳过文件头部分
-        data_start = False
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+        主进程顺序读取文件并按时间戳行切分为数据块，
+        数据块的解析可分发到进程池中与读取并行进行
 
-            # 找到数据部分的开始（第一个时间戳）
-            if line.startswith("#") and not data_start:
-                data_start = True
+        参数:
+        f: 文件迭代器（已读取到文件头之后）
+        first_frame: 文件头解析时读到的第一个时间戳行
+        parallel: 是否使用多进程解析
+        """
+        current_entities = {}  # 当前活跃的实体，键为ID
+        self._sample_ids = []
+        self._samples = []
 
-            if not data_start:
-                continue
+        chunks = _iter_chunks(itertools.chain((first_frame,), f), _CHUNK_LINES)
 
-            # 解析时间戳行
-            if line.startswith("#"):
-                try:
-                    # 解析时间（相对于参考时间的秒数）
-                    time_str = line[1:].strip()
-                    time_offset = float(time_str)
-                    current_time = self.reference_time + timedelta(seconds=time_offset)
-                    #print(f"处理时间: {current_time}")
-                except ValueError as e:
-                    print(f"解析时间戳出错: {line}, 错误: {e}")
-                    continue
+        pool = None
+        if parallel:
+            pool = multiprocessing.get_context('spawn').Pool()
 
-            # 解析实体数据行
-            elif line and "," in line and "=" in line:
-                try:
-                    # 提取实体ID
-                    parts = line.split(",", 1)
-                    entity_id = parts[0]
-
-                    # 解析实体数据
-                    self._parse_entity_data(entity_id, parts[1], current_time, current_entities)
-                except Exception as e:
-                    print(f"解析实体数据出错: {line}, 错误: {e}")
-                    continue
+        try:
+            # imap保持数据块顺序，确保实体属性取自其首次出现的行
+            results = pool.imap(_parse_chunk, chunks) if pool else map(_parse_chunk, chunks)
+            for entity_ids, samples, first_attrs in results:
+                for entity_id, attrs in first_attrs.items():
+                    if entity_id not in current_entities:
+                        current_entities[entity_id] = self._create_entity(entity_id, attrs)
+
+                if len(samples):
+                    self._sample_ids.append(entity_ids)
+                    self._samples.append(samples)
+        except BaseException:
+            # 出错时立即终止进程池，不再等待剩余数据块解析完成
+            if pool:
+                pool.terminate()
+                pool.join()
+            raise
+
+        if pool:
+            pool.close()
+            pool.join()
+
+        # 批量转换坐标并写入实体轨迹
+        self._flush_samples(current_entities)
+
+        # 将所有实体添加到数据引擎（只添加有轨迹数据的实体）
+        self.data_engine.add_entities(
+            entity for entity in current_entities.values() if entity.n_points)
+
+    def _create_entity(self, entity_id, attrs):
+        """
+        根据实体首次出现时的属性创建实体
 
-        # 将所有实体添加到数据引擎
-        for entity in current_entities.values():
-            if entity.trajectory:  # 只添加有轨迹数据的实体
-                self.data_engine.add_entity(entity)
-                #print(f"添加实体: {entity.name}, 轨迹点数量: {len(entity.trajectory)}")
+        参数:
+        entity_id: 实体ID
+        attrs: 属性字典
+        """
+        # 解析实体属性
+        name = attrs.get('Name')
+        entity_type = attrs.get('Type')
+        color = None
+        radius = None
+
+        # 查找Radius属性 (用于爆炸效果)
+        radius_str = attrs.get('Radius')
+        if radius_str:
+            try:
+                radius = float(radius_str)
+            except ValueError:
+                radius = 100  # 默认半径
+
+        # 如果未找到名称，使用ID作为名称
+        if not name:
+            name = f"Unknown {entity_id}"
+
+        # 查找颜色属性
+        color_name = attrs.get('Color')
+        if color_name:
+            # 根据颜色名称设置RGB值
+            color = _COLOR_LUT.get(color_name.lower(), _DEFAULT_COLOR)
+
+        # 创建新实体
+        entity = Entity(entity_id, name, entity_type, None)  # 不设置coalition
+        entity.color = color
+
+        # 对于爆炸类型，设置特殊属性
+        if entity_type and "explosion" in entity_type.lower():
+            entity.is_explosion = True
+            entity.radius = radius if radius else 300  # 默认爆炸半径
+            logger.debug("创建爆炸实体: %s, 半径: %s", name, entity.radius)
+        elif (entity_id.startswith('A') or entity_id.startswith('B')) and name and "AIM" in name:
+            entity.is_missile = True
+            logger.debug("创建导弹实体: %s", name)
+        else:
+            entity.is_aircraft = True
+            logger.debug("创建飞机实体: %s", name)
+
+        return entity
 
-    def _parse_entity_data(self, entity_id, data, current_time, current_entities):
+    def _flush_samples(self, current_entities):
         """
-        解析实体数据行
+        批量转换暂存的轨迹采样并写入对应实体
 
         参数:
-        entity_id: 实体ID
-        data: 实体数据部分
-        current_time: 当前时间戳
         current_entities: 当前实体字典
         """
-        # 检查是否需要创建新实体
-        if entity_id not in current_entities:
-            # 解析实体属性
-            name = None
-            color = None
-            entity_type = None
-            radius = None
-
-            # 查找Name属性
-            name_match = re.search(r'Name=([^,]+)', data)
-            if name_match:
-                name = name_match.group(1)
-
-            # 查找Type属性
-            type_match = re.search(r'Type=([^,]+)', data)
-            if type_match:
-                entity_type = type_match.group(1)
-
-            # 查找Radius属性 (用于爆炸效果)
-            radius_match = re.search(r'Radius=([^,]+)', data)
-            if radius_match:
-                try:
-                    radius = float(radius_match.group(1))
-                except ValueError:
-                    radius = 100  # 默认半径
-
-            # 如果未找到名称，使用ID作为名称
-            if not name:
-                name = f"Unknown {entity_id}"
-
-            # 查找颜色属性
-            color_match = re.search(r'Color=([^,]+)', data)
-            if color_match:
-                color_name = color_match.group(1)
-
-                # 根据颜色名称设置RGB值
-                if color_name.lower() == 'red':
-                    color = (1.0, 0.0, 0.0)  # 红色
-                elif color_name.lower() == 'blue':
-                    color = (0.0, 0.0, 1.0)  # 蓝色
-                elif color_name.lower() == 'green':
-                    color = (0.0, 1.0, 0.0)  # 绿色
-                else:
-                    color = (0.7, 0.7, 0.7)  # 默认灰色
-
-            # 创建新实体
-            entity = Entity(entity_id, name, entity_type, None)  # 不设置coalition
-            entity.color = color
-
-            # 对于爆炸类型，设置特殊属性
-            if entity_type and "explosion" in entity_type.lower():
-                entity.is_explosion = True
-                entity.radius = radius if radius else 300  # 默认爆炸半径
-                print(f"创建爆炸实体: {name}, 半径: {entity.radius}")
-            elif (entity_id.startswith('A') or entity_id.startswith('B')) and name and "AIM" in name:
-                entity.is_missile = True
-                print(f"创建导弹实体: {name}")
-            else:
-                entity.is_aircraft = True
-                print(f"创建飞机实体: {name}")
-
-            current_entities[entity_id] = entity
-        else:
-            entity = current_entities[entity_id]
+        if not self._samples:
+            return
+
+        samples = np.concatenate(self._samples)
+        entity_ids = np.concatenate(self._sample_ids)
+        self._sample_ids = []
+        self._samples = []
+
+        # 一次性转换所有采样点的坐标（ENU, X=East, Y=North, Z=Up）
+        positions = self._geodetic_to_enu(samples[:, 2], samples[:, 1], samples[:, 3])
+        orientations = np.radians(samples[:, 4:7])
+
+        # 按实体ID分组（稳定排序保持各实体内的时间顺序）
+        unique_ids, inverse = np.unique(entity_ids, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse))[:-1]
+
+        for entity_id, indices in zip(unique_ids, np.split(order, bounds)):
+            entity_orientations = orientations[indices]
+            if np.isnan(entity_orientations).all():
+                entity_orientations = None
+
+            current_entities[entity_id].add_points(samples[indices, 0], positions[indices],
+                                                   entity_orientations)
+
+    def _geodetic_to_enu(self, lat_deg, lon_deg, alt_m):
+        """
+        将经纬高数组转换为相对参考点的ENU坐标
+
+        参数:
+        lat_deg: 纬度数组（度）
+        lon_deg: 经度数组（度）
+        alt_m: 高度数组（米）
+
+        返回:
+        N×3的ENU坐标数组
+        """
+        x, y, z = pymap3d.geodetic2ecef(lat_deg, lon_deg, alt_m)
+
+        dx = x - self._ref_ecef[0]
+        dy = y - self._ref_ecef[1]
+        dz = z - self._ref_ecef[2]
+
+        # ECEF偏移旋转到参考点的当地ENU坐标系
+        tmp = self._cos_ref_lon * dx + self._sin_ref_lon * dy
+        east = -self._sin_ref_lon * dx + self._cos_ref_lon * dy
+        north = -self._sin_ref_lat * tmp + self._cos_ref_lat * dz
+        up = self._cos_ref_lat * tmp + self._sin_ref_lat * dz
+
+        return np.column_stack((east, north, up))
+
+
+def _iter_chunks(lines, chunk_lines):
+    """
+    将数据行切分为块，每块以时间戳行开头
+
+    参数:
+    lines: 数据行迭代器（第一行为时间戳行）
+    chunk_lines: 每块的目标行数
+    """
+    chunk = []
+    for line in lines:
+        # 只在时间戳行处切分，保证每块都能独立确定当前时间
+        if len(chunk) >= chunk_lines and line.lstrip().startswith("#"):
+            yield chunk
+            chunk = []
+        chunk.append(line)
+
+    if chunk:
+        yield chunk
+
 
-        # 提取位置数据
-        t_match = re.search(r'T=([^,]+)', data)
-        if t_match and current_time:
+def _parse_chunk(lines):
+    """
+    解析一个数据块（可在子进程中运行）
+
+    参数:
+    lines: 以时间戳行开头的数据行列表
+
+    返回:
+    (entity_ids, samples, first_attrs)：采样所属实体ID数组、N×7采样数组、
+    块内每个实体首次出现时的属性字典
+    """
+    current_time = None    # 当前时间（相对参考时间的秒数）
+    entity_ids = []
+    samples = []
+    first_attrs = {}
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        # 解析时间戳行
+        if line.startswith("#"):
             try:
-                t_values = t_match.group(1).split('|')
-                if len(t_values) >= 3:
-                    # 解析位置坐标
-                    lon_deg = float(t_values[0])
-                    lat_deg = float(t_values[1])
-                    alt_m = float(t_values[2])
-
-                    n, e, d = pymap3d.geodetic2ned(lat_deg, lon_deg, alt_m,
-                                                   self.reference_lat_deg,
-                                                   self.reference_lon_deg,
-                                                   self.reference_alt_m)
-
-                    # 转换为 ENU, X=East, Y=North, Z=Up
-                    x = e
-                    y = n
-                    z = -d
-
-                    # 解析方向（如果有）
-                    orientation = None
-                    if len(t_values) >= 6:
-                        pitch = math.radians(float(t_values[3]))
-                        yaw = math.radians(float(t_values[4]))
-                        roll = math.radians(float(t_values[5]))
-                        orientation = [pitch, yaw, roll]
-
-                    # 添加轨迹点
-                    entity.add_point(current_time, [x, y, z], orientation)
-                    #print(f"添加轨迹点: {entity.name}, 位置: {[x, y, z]}")
+                # 解析时间（相对于参考时间的秒数）
+                time_str = line[1:].strip()
+                current_time = float(time_str)
             except ValueError as e:
-                print(f"解析位置数据出错: {t_match.group(1)}, 错误: {e}")
\ No newline at end of file
+                logger.warning("解析时间戳出错: %s, 错误: %s", line, e)
+                continue
+
+        # 解析实体数据行
+        elif "," in line and "=" in line:
+            try:
+                # 提取实体ID
+                entity_id, data = line.split(",", 1)
+
+                # 一次性切分出所有属性（key=value，以逗号分隔）
+                attrs = dict(part.split('=', 1) for part in data.split(',') if '=' in part)
+                if entity_id not in first_attrs:
+                    first_attrs[entity_id] = attrs
+
+                # 提取位置数据
+                t_value = attrs.get('T')
+                if t_value and current_time is not None:
+                    sample = _parse_position(t_value, current_time)
+                    if sample is not None:
+                        entity_ids.append(entity_id)
+                        samples.append(sample)
+            except Exception as e:
+                logger.warning("解析实体数据出错: %s, 错误: %s", line, e)
+                continue
+
+    return (np.array(entity_ids, dtype=str),
+            np.array(samples, dtype=np.float64).reshape(-1, 7),
+            first_attrs)
+
+
+def _parse_position(t_value, current_time):
+    """
+    解析T属性（经度|纬度|高度[|俯仰|偏航|滚转]）
+
+    返回:
+    (时间, 经度, 纬度, 高度, 俯仰, 偏航, 滚转)，格式不完整或出错时返回None
+    """
+    try:
+        t_values = t_value.split('|')
+        if len(t_values) < 3:
+            return None
+
+        # 解析位置坐标
+        lon_deg = float(t_values[0])
+        lat_deg = float(t_values[1])
+        alt_m = float(t_values[2])
+
+        # 解析方向（如果有，单位为度）
+        pitch = yaw = roll = math.nan
+        if len(t_values) >= 6:
+            pitch = float(t_values[3])
+            yaw = float(t_values[4])
+            roll = float(t_values[5])
+
+        return (current_time, lon_deg, lat_deg, alt_m, pitch, yaw, roll)
+    except ValueError as e:
+        logger.warning("解析位置数据出错: %s, 错误: %s", t_value, e)
+        return None
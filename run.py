@@ -2,6 +2,7 @@
 PyTacView - 简化版
 应用程序入口点
 """
+import logging
 import sys
 from PyQt5.QtWidgets import QApplication
 from ui.main_window import MainWindow
@@ -10,6 +11,9 @@ def main():
     """
     应用程序主函数
     """
+    # 配置日志（默认只输出警告及以上级别）
+    logging.basicConfig(level=logging.WARNING)
+    
     # 创建应用程序
     app = QApplication(sys.argv)
     
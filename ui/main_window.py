@@ -2,12 +2,12 @@
 主窗口 - 简化版
 创建应用程序主界面，整合各组件
 """
-from datetime import timedelta
+import math
 
 from PyQt5.QtWidgets import (QMainWindow, QAction, QFileDialog, QWidget,
                             QVBoxLayout, QHBoxLayout, QLabel, QSlider, 
                             QPushButton, QToolBar, QStatusBar, QDockWidget)
-from PyQt5.QtCore import Qt, QDateTime
+from PyQt5.QtCore import Qt, QDateTime, QTimer
 from PyQt5.QtGui import QIcon
 
 from core.data_engine import DataEngine
@@ -24,6 +24,16 @@ class MainWindow(QMainWindow):
         # 创建数据引擎
         self.data_engine = DataEngine()
         
+        # 时间滑块更新合并定时器（拖动时每16ms最多刷新一次）
+        self._pending_slider_value = None
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(16)
+        self._update_timer.timeout.connect(self._apply_time_update)
+        
+        # 时间标签上次显示的整秒（整秒不变时不重新格式化）
+        self._last_sec = None
+        
         # 创建UI
         self.init_ui()
         
@@ -231,7 +241,10 @@ class MainWindow(QMainWindow):
             
             if success:
                 # 更新视图控制器的数据引擎
-                self.view_control.data_engine = self.data_engine
+                self.view_control.set_data_engine(self.data_engine)
+                
+                # 参考时间已改变，清除时间标签缓存
+                self._last_sec = None
                 
                 # 更新时间滑块
                 self._update_time_controls()
@@ -251,9 +264,9 @@ class MainWindow(QMainWindow):
         """更新时间控制"""
         start_time, end_time = self.data_engine.get_time_range()
         
-        if start_time and end_time:
+        if start_time is not None and end_time is not None:
             # 计算总时间范围（秒）
-            total_seconds = (end_time - start_time).total_seconds()
+            total_seconds = end_time - start_time
             
             # 设置滑块范围（使用1000作为最大值，实现毫秒级精度）
             self.time_slider.setRange(0, int(total_seconds * 10))
@@ -263,18 +276,38 @@ class MainWindow(QMainWindow):
         
     def _update_time_label(self):
         """更新时间标签"""
-        if self.data_engine.current_time:
-            time_str = self.data_engine.current_time.strftime("%H:%M:%S")
+        if self.data_engine.current_time is not None:
+            # 显示的绝对时间所在的整秒（计入参考时间的小数秒）
+            sec = math.floor(self.data_engine.current_time
+                             + self.data_engine.reference_time.microsecond / 1e6)
+            if sec == self._last_sec:
+                return
+            
+            # 仅在显示时换算为绝对时间
+            current_time = self.data_engine.seconds_to_time(self.data_engine.current_time)
+            time_str = current_time.strftime("%H:%M:%S")
+            self._last_sec = sec
             self.time_label.setText(f"时间: {time_str}")
             
     def _time_slider_changed(self, value):
         """时间滑块值变化处理函数"""
+        # 只记录最新值，实际更新由定时器合并执行
+        self._pending_slider_value = value
+        if not self._update_timer.isActive():
+            self._update_timer.start()
+            
+    def _apply_time_update(self):
+        """应用最近一次时间滑块的值"""
+        value = self._pending_slider_value
+        if value is None:
+            return
+        self._pending_slider_value = None
+        
         start_time, _ = self.data_engine.get_time_range()
         
-        if start_time:
-            # 计算新时间（秒）
-            seconds = value / 10.0
-            new_time = start_time + timedelta(seconds=seconds)
+        if start_time is not None:
+            # 滑块值以0.1秒为单位，直接换算为相对时间（秒）
+            new_time = start_time + value / 10.0
             
             # 设置新时间
             self.data_engine.set_time(new_time)
@@ -317,7 +350,7 @@ class MainWindow(QMainWindow):
         """重置时间到开始时间"""
         start_time, _ = self.data_engine.get_time_range()
         
-        if start_time:
+        if start_time is not None:
             # 设置为开始时间
             self.data_engine.set_time(start_time)
             
@@ -2,27 +2,118 @@
 视图控制 - 简化版
 负责3D渲染和相机控制
 """
-from PyQt5.QtWidgets import QOpenGLWidget
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from PyQt5.QtCore import Qt, QTimer, QElapsedTimer
+from PyQt5.QtGui import QOpenGLWindow, QSurfaceFormat
+import ctypes
 import numpy as np
 import OpenGL.GL as GL
-import OpenGL.GLU as GLU
+from OpenGL.GL import shaders
 import math
-from datetime import timedelta
 
-class ViewControl(QOpenGLWidget):
+# 着色器：顶点位置经MVP矩阵变换，颜色取自顶点属性（爆炸为实例属性）；
+# 绘制轨迹时按顶点时间从轨迹起点到当前时间渐显；
+# 实例化绘制时顶点按实例属性（中心、半径）缩放平移，
+# 其余绘制中该属性保持默认值(0, 0, 0, 1)，不影响顶点位置；
+# 点的大小取自顶点属性，不同类别的标记可以在一次绘制中使用不同大小
+_VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 aPos;
+layout(location = 1) in vec4 aColor;
+layout(location = 2) in float aTime;
+layout(location = 3) in vec4 aInstance;  // 实例中心(xyz)和缩放(w)
+layout(location = 4) in float aSize;     // 点大小（像素）
+uniform mat4 uMVP;
+uniform float uFadeStart;  // 轨迹起始时间
+uniform float uFadeScale;  // 轨迹长度的倒数，为0时不渐隐
+out vec4 vColor;
+
+void main()
+{
+    gl_Position = uMVP * vec4(aInstance.xyz + aInstance.w * aPos, 1.0);
+    gl_PointSize = aSize;
+    vColor = aColor;
+    if (uFadeScale > 0.0)
+        vColor.a *= clamp((aTime - uFadeStart) * uFadeScale, 0.0, 1.0);
+}
+"""
+
+_FRAGMENT_SHADER = """
+#version 330 core
+in vec4 vColor;
+out vec4 fragColor;
+
+void main()
+{
+    fragColor = vColor;
+}
+"""
+
+# 顶点格式：字段按名称对应着色器的属性位置；uint8字段按归一化整数上传
+_ATTRIBUTE_LOCATIONS = {'position': 0, 'color': 1, 'time': 2, 'size': 4}
+_POSITION_VERTEX = np.dtype([('position', np.float32, 3)])
+_COLOR_VERTEX = np.dtype([('position', np.float32, 3), ('color', np.float32, 4)])
+_MARKER_VERTEX = np.dtype([('position', np.float32, 3), ('color', np.float32, 4),
+                           ('size', np.float32)])
+_TRAIL_VERTEX = np.dtype([('position', np.float32, 3), ('color', np.uint8, 4),
+                          ('time', np.float32)])
+
+# 流式缓冲映射方式：整块失效后写入，无需与GPU同步
+_STREAM_MAP_FLAGS = (GL.GL_MAP_WRITE_BIT | GL.GL_MAP_INVALIDATE_BUFFER_BIT |
+                     GL.GL_MAP_UNSYNCHRONIZED_BIT)
+
+class ViewControl(QWidget):
     """
-    3D视图控制器，负责渲染和相机控制
+    3D视图控件
+
+    渲染在原生窗口（ViewControlWindow）中进行，通过createWindowContainer嵌入，
+    避免QOpenGLWidget每帧经FBO合成到窗口部件的开销；
+    其余属性和方法委托给渲染窗口
     """
     def __init__(self, data_engine, parent=None):
         super().__init__(parent)
+        self.render_window = ViewControlWindow(data_engine)
+
+        # 嵌入渲染窗口
+        container = QWidget.createWindowContainer(self.render_window, self)
+        container.setFocusPolicy(Qt.StrongFocus)  # 允许接收键盘事件
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(container)
+
+    def __getattr__(self, name):
+        """未在控件上定义的属性委托给渲染窗口"""
+        if name == 'render_window':
+            raise AttributeError(name)
+        return getattr(self.render_window, name)
+
+    def update(self):
+        """请求重绘渲染窗口"""
+        self.render_window.update()
+
+
+class ViewControlWindow(QOpenGLWindow):
+    """
+    3D视图渲染窗口，负责渲染和相机控制
+    """
+    def __init__(self, data_engine, parent=None):
+        super().__init__(QOpenGLWindow.NoPartialUpdate, parent)
         self.data_engine = data_engine
         
+        # 使用OpenGL 3.3核心模式
+        surface_format = QSurfaceFormat()
+        surface_format.setVersion(3, 3)
+        surface_format.setProfile(QSurfaceFormat.CoreProfile)
+        surface_format.setDepthBufferSize(24)
+        self.setFormat(surface_format)
+        
         # 相机参数
         self.camera_distance = 100000  # 相机距离
         self.camera_azimuth = 0        # 方位角（水平旋转）
         self.camera_elevation = 45     # 仰角（垂直旋转）
-        self.camera_target = np.array([0., 0., 0.])  # 相机目标点
+        self.camera_target_x = 0.0     # 相机目标点
+        self.camera_target_y = 0.0
+        self.camera_target_z = 0.0
         
         # 视图参数
         self.fov = 45.0  # 视野角度
@@ -33,20 +124,62 @@ class ViewControl(QOpenGLWidget):
         self.zoom_sensitivity = 0.1   # 缩放灵敏度
         
         # 轨迹渲染参数
-        self.trail_length = timedelta(seconds=30)  # 轨迹长度
+        self.trail_length = 30.0         # 轨迹长度（秒）
         self.show_trails = True          # 是否显示轨迹
         self.show_markers = True         # 是否显示标记
         self.marker_size = 5.0           # 标记大小
+
+        # 最近一帧的轨迹绘制范围，键为(时间, 轨迹长度, 打包版本号, 实体ID)
+        self._trail_frame_key = None
+        self._trail_frame = None
+
+        # 着色器程序和变换矩阵（在initializeGL/resizeGL中创建）
+        self._program = None
+        self._mvp_location = -1
+        self._fade_start_location = -1
+        self._fade_scale_location = -1
+        self._projection = np.identity(4)
+        self._view_projection = np.identity(4)
+        self._camera_pos = (0.0, 0.0, 0.0)  # 相机位置（世界坐标）
+        self._camera_dirty = True        # 相机或投影变化后需重新计算MVP矩阵
+
+        # 所有实体轨迹点的共享顶点缓冲（数据引擎打包数组的GPU副本）
+        self._trail_vbo = None
+        self._trail_vao = None
+        self._trail_vbo_generation = -1  # 缓冲对应的打包版本号
+        self._trail_colors = None        # 每个轨迹点的颜色（CPU副本）
+
+        # 轨迹两端插值线段、标记的动态顶点缓冲（每帧更新）
+        self._trail_end_vbo = None
+        self._trail_end_vao = None
+        self._marker_vbo = None
+        self._marker_vao = None
+        self._stream_capacity = {}       # 动态缓冲容量（字节），键为缓冲ID
+
+        # 按类别分组的当前帧实体及位置（每帧清空后复用）
+        self._explosion_list, self._explosion_positions = [], []
+        self._missile_list, self._missile_positions = [], []
+        self._aircraft_list, self._aircraft_positions = [], []
+
+        # 静态几何：坐标轴和地面网格（位置+颜色交错存储）
+        self._static_vbo = None
+        self._static_vao = None
+        self._axes_count = 0
+        self._grid_count = 0
+
+        # 爆炸效果使用的单位球体
+        self._sphere_vbo = None
+        self._sphere_ebo = None
+        self._sphere_vao = None
+        self._sphere_index_count = 0
+        self._explosion_vbo = None       # 爆炸实例属性：中心、半径、颜色
         
         # 动画参数
         self.play_timer = QTimer(self)
         self.play_timer.timeout.connect(self.advance_time)
         self.play_speed = 1.0  # 播放速度（倍数）
         self.is_playing = False
-        
-        # 初始化UI参数
-        self.setFocusPolicy(Qt.StrongFocus)  # 允许接收键盘事件
-        self.setMouseTracking(True)          # 跟踪鼠标移动
+        self._play_clock = QElapsedTimer()  # 上次推进时间以来的实际耗时
         
     def initializeGL(self):
         """初始化OpenGL环境"""
@@ -64,8 +197,38 @@ class ViewControl(QOpenGLWidget):
         GL.glEnable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
         
-        # 设置点大小
+        # 设置点大小（标记的点大小由着色器按顶点设置）
         GL.glPointSize(self.marker_size)
+        GL.glEnable(GL.GL_PROGRAM_POINT_SIZE)
+        
+        # 编译着色器
+        self._program = shaders.compileProgram(
+            shaders.compileShader(_VERTEX_SHADER, GL.GL_VERTEX_SHADER),
+            shaders.compileShader(_FRAGMENT_SHADER, GL.GL_FRAGMENT_SHADER),
+            validate=False)  # 核心模式下未绑定VAO时校验会误报
+        self._mvp_location = GL.glGetUniformLocation(self._program, "uMVP")
+        self._fade_start_location = GL.glGetUniformLocation(self._program, "uFadeStart")
+        self._fade_scale_location = GL.glGetUniformLocation(self._program, "uFadeScale")
+        self._camera_dirty = True
+        
+        # 静态几何（坐标轴和地面网格）只上传一次
+        self._static_vbo = GL.glGenBuffers(1)
+        self._upload_static_geometry()
+        self._static_vao = self._create_vertex_array(self._static_vbo, _COLOR_VERTEX)
+        
+        # 轨迹和标记缓冲（轨迹顶点为位置+颜色+时间）
+        self._trail_vbo = GL.glGenBuffers(1)
+        self._trail_vao = self._create_vertex_array(self._trail_vbo, _TRAIL_VERTEX)
+        self._trail_end_vbo = GL.glGenBuffers(1)
+        self._trail_end_vao = self._create_vertex_array(self._trail_end_vbo, _TRAIL_VERTEX)
+        self._marker_vbo = GL.glGenBuffers(1)
+        self._marker_vao = self._create_vertex_array(self._marker_vbo, _MARKER_VERTEX)
+        self._stream_capacity = {}
+        self._trail_vbo_generation = -1
+        self._trail_frame_key = None
+        
+        # 爆炸球体
+        self._upload_sphere()
         
     def resizeGL(self, width, height):
         """处理窗口大小变化"""
@@ -77,19 +240,15 @@ class ViewControl(QOpenGLWidget):
         GL.glViewport(0, 0, width, height)
         
         # 设置投影矩阵
-        GL.glMatrixMode(GL.GL_PROJECTION)
-        GL.glLoadIdentity()
         aspect = width / height
-        GLU.gluPerspective(self.fov, aspect, 100.0, 10000000.0)
-        
-        # 切换回模型视图矩阵
-        GL.glMatrixMode(GL.GL_MODELVIEW)
+        self._projection = _perspective(self.fov, aspect, 100.0, 10000000.0)
+        self._camera_dirty = True
         
     def paintGL(self):
         """渲染3D场景"""
         # 清除缓冲区
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
-        GL.glLoadIdentity()
+        GL.glUseProgram(self._program)
         
         # 设置相机位置
         self._setup_camera()
@@ -101,15 +260,21 @@ class ViewControl(QOpenGLWidget):
         self._draw_grid()
         
         # 获取当前时间的实体
-        if self.data_engine.current_time:
+        if self.data_engine.current_time is not None:
             # 绘制实体和轨迹
             self._draw_entities()
             
             # 绘制时间信息
             self._draw_time_info()
             
+        GL.glBindVertexArray(0)
+        GL.glUseProgram(0)
+            
     def _setup_camera(self):
-        """设置相机视角"""
+        """设置相机视角（相机未变化时沿用着色器中已有的MVP矩阵）"""
+        if not self._camera_dirty:
+            return
+        
         # 计算相机位置（球坐标转笛卡尔坐标）
         azimuth_rad = math.radians(self.camera_azimuth)
         elevation_rad = math.radians(self.camera_elevation)
@@ -118,224 +283,369 @@ class ViewControl(QOpenGLWidget):
         y = self.camera_distance * math.cos(elevation_rad) * math.cos(azimuth_rad)
         z = self.camera_distance * math.sin(elevation_rad)
         
-        camera_pos = self.camera_target + np.array([x, y, z])
+        target = (self.camera_target_x, self.camera_target_y, self.camera_target_z)
+        self._camera_pos = (target[0] + x, target[1] + y, target[2] + z)
+        
+        # 设置视图（向上向量为Z轴）
+        view = _look_at(self._camera_pos, target, (0.0, 0.0, 1.0))
+        self._view_projection = self._projection @ view
+        self._set_mvp(self._view_projection)
+        self._camera_dirty = False
         
-        # 设置视图
-        GLU.gluLookAt(
-            camera_pos[0], camera_pos[1], camera_pos[2],  # 相机位置
-            self.camera_target[0], self.camera_target[1], self.camera_target[2],  # 目标点
-            0, 0, 1  # 向上向量（Z轴朝上）
-        )
+    def _set_mvp(self, matrix):
+        """设置着色器的MVP矩阵"""
+        GL.glUniformMatrix4fv(self._mvp_location, 1, GL.GL_TRUE, matrix.astype(np.float32))
         
     def _draw_axes(self):
         """绘制坐标轴"""
-        axis_length = 50000  # 坐标轴长度
-        
-        GL.glBegin(GL.GL_LINES)
-        
-        # X轴（红色）
-        GL.glColor3f(1.0, 0.0, 0.0)
-        GL.glVertex3f(0, 0, 0)
-        GL.glVertex3f(axis_length, 0, 0)
-        
-        # Y轴（绿色）
-        GL.glColor3f(0.0, 1.0, 0.0)
-        GL.glVertex3f(0, 0, 0)
-        GL.glVertex3f(0, axis_length, 0)
-        
-        # Z轴（蓝色）
-        GL.glColor3f(0.0, 0.0, 1.0)
-        GL.glVertex3f(0, 0, 0)
-        GL.glVertex3f(0, 0, axis_length)
-        
-        GL.glEnd()
+        GL.glBindVertexArray(self._static_vao)
+        GL.glDrawArrays(GL.GL_LINES, 0, self._axes_count)
         
     def _draw_grid(self):
         """绘制地面网格"""
-        grid_size = 100000  # 网格大小
-        grid_step = 10000   # 网格步长
+        GL.glBindVertexArray(self._static_vao)
+        GL.glDrawArrays(GL.GL_LINES, self._axes_count, self._grid_count)
         
-        GL.glColor3f(0.3, 0.3, 0.3)  # 灰色
-        GL.glBegin(GL.GL_LINES)
+    def _upload_static_geometry(self):
+        """生成坐标轴和地面网格顶点（位置+颜色）并上传到静态顶点缓冲"""
+        axis_length = 50000  # 坐标轴长度
+        grid_size = 100000   # 网格大小
+        grid_step = 10000    # 网格步长
+        
+        # 坐标轴：X轴红色、Y轴绿色、Z轴蓝色
+        axes = np.zeros((6, 7), dtype=np.float32)
+        for axis in range(3):
+            axes[axis * 2 + 1, axis] = axis_length
+            axes[axis * 2:axis * 2 + 2, 3 + axis] = 1.0
+        axes[:, 6] = 1.0
+        
+        # 网格：X方向和Y方向的线（灰色）
+        ticks = np.arange(-grid_size, grid_size + 1, grid_step, dtype=np.float32)
+        ends = np.repeat([[-grid_size, grid_size]], len(ticks), axis=0).ravel()
+        tick_pairs = np.repeat(ticks, 2)
+        grid = np.zeros((len(tick_pairs) * 2, 7), dtype=np.float32)
+        grid[:len(tick_pairs), 0] = tick_pairs
+        grid[:len(tick_pairs), 1] = ends
+        grid[len(tick_pairs):, 0] = ends
+        grid[len(tick_pairs):, 1] = tick_pairs
+        grid[:, 3:6] = 0.3
+        grid[:, 6] = 1.0
+        
+        vertices = np.concatenate((axes, grid))
+        self._axes_count = len(axes)
+        self._grid_count = len(grid)
+        
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._static_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        
+    def _upload_sphere(self):
+        """生成单位球体网格（20个经度和纬度细分）并上传"""
+        vertices, indices = _unit_sphere(20, 20)
+        
+        self._sphere_vbo = GL.glGenBuffers(1)
+        self._sphere_vao = self._create_vertex_array(self._sphere_vbo, _POSITION_VERTEX)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._sphere_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
+        
+        # 索引缓冲绑定状态记录在VAO中
+        GL.glBindVertexArray(self._sphere_vao)
+        self._sphere_ebo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._sphere_ebo)
+        GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL.GL_STATIC_DRAW)
+        self._sphere_index_count = len(indices)
+        
+        # 每个实例8个float：中心(3)+半径(1)→location 3，颜色(4)→location 1
+        self._explosion_vbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._explosion_vbo)
+        GL.glEnableVertexAttribArray(3)
+        GL.glVertexAttribPointer(3, 4, GL.GL_FLOAT, GL.GL_FALSE, 32, ctypes.c_void_p(0))
+        GL.glVertexAttribDivisor(3, 1)
+        GL.glEnableVertexAttribArray(1)
+        GL.glVertexAttribPointer(1, 4, GL.GL_FLOAT, GL.GL_FALSE, 32, ctypes.c_void_p(16))
+        GL.glVertexAttribDivisor(1, 1)
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        
+    def _create_vertex_array(self, vbo, vertex_format):
+        """
+        创建顶点数组对象（顶点属性交错存储）
         
-        # 绘制X方向的线
-        for i in range(-grid_size, grid_size + 1, grid_step):
-            GL.glVertex3f(i, -grid_size, 0)
-            GL.glVertex3f(i, grid_size, 0)
-            
-        # 绘制Y方向的线
-        for i in range(-grid_size, grid_size + 1, grid_step):
-            GL.glVertex3f(-grid_size, i, 0)
-            GL.glVertex3f(grid_size, i, 0)
-            
-        GL.glEnd()
+        参数:
+        vbo: 顶点缓冲
+        vertex_format: 顶点格式（numpy结构化dtype），字段按名称对应属性位置
+                       （position 0、color 1、time 2、size 4）
+        """
+        vao = GL.glGenVertexArrays(1)
+        GL.glBindVertexArray(vao)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
+        for name in vertex_format.names:
+            location = _ATTRIBUTE_LOCATIONS[name]
+            field, offset = vertex_format.fields[name][:2]
+            size = field.shape[0] if field.shape else 1
+            if field.base == np.uint8:
+                gl_type, normalized = GL.GL_UNSIGNED_BYTE, GL.GL_TRUE
+            else:
+                gl_type, normalized = GL.GL_FLOAT, GL.GL_FALSE
+            GL.glEnableVertexAttribArray(location)
+            GL.glVertexAttribPointer(location, size, gl_type, normalized, vertex_format.itemsize,
+                                     ctypes.c_void_p(offset))
+        GL.glBindVertexArray(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        return vao
+        
+    def _upload_stream(self, vbo, data):
+        """
+        将每帧变化的数据写入动态顶点缓冲
+        
+        参数:
+        vbo: 顶点缓冲
+        data: 连续的顶点数组
+        """
+        if data.nbytes == 0:
+            return
+        data = np.ascontiguousarray(data)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
+        if self._stream_capacity.get(vbo, 0) < data.nbytes:
+            # 容量不足时按两倍重新分配
+            self._stream_capacity[vbo] = max(data.nbytes * 2, 4096)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, self._stream_capacity[vbo], None, GL.GL_STREAM_DRAW)
+        # 映射时丢弃旧内容，驱动另分配存储，不必等待上一帧的绘制完成
+        try:
+            ptr = GL.glMapBufferRange(GL.GL_ARRAY_BUFFER, 0, data.nbytes, _STREAM_MAP_FLAGS)
+        except GL.GLError:
+            ptr = None
+        if ptr:
+            ctypes.memmove(ptr, data.ctypes.data, data.nbytes)
+            GL.glUnmapBuffer(GL.GL_ARRAY_BUFFER)
+        else:
+            # 映射失败时退回到普通上传
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, data.nbytes, data)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
         
     def _draw_entities(self):
         """绘制实体和轨迹"""
         current_entities = self.data_engine.get_entities_at_time()
+
+        if self.show_trails:
+            self._update_trail_buffer()
         
-        # 先绘制爆炸效果（使用透明度）
-        for entity_id, data in current_entities.items():
-            entity = data['entity']
-            position = data['position']
+        # 一次遍历按类别分组
+        explosions, explosion_positions = self._explosion_list, self._explosion_positions
+        missiles, missile_positions = self._missile_list, self._missile_positions
+        aircraft, aircraft_positions = self._aircraft_list, self._aircraft_positions
+        for group in (explosions, explosion_positions, missiles, missile_positions,
+                      aircraft, aircraft_positions):
+            group.clear()
 
+        for data in current_entities.values():
+            entity = data['entity']
             if entity.is_explosion:
-                self._draw_explosion(entity, position)
+                explosions.append(entity)
+                explosion_positions.append(data['position'])
+            if entity.is_missile:
+                missiles.append(entity)
+                missile_positions.append(data['position'])
+            if entity.is_aircraft:
+                aircraft.append(entity)
+                aircraft_positions.append(data['position'])
 
-        # 然后绘制导弹
-        for entity_id, data in current_entities.items():
-            entity = data['entity']
-            position = data['position']
+        if self.show_markers:
+            # 先绘制不透明的标记：导弹点略小，十字只画水平两条线
+            self._draw_markers((
+                (missiles, missile_positions, (1.0, 0.5, 0.0), self.marker_size * 0.8, 500, 2),
+                (aircraft, aircraft_positions, (1.0, 1.0, 1.0), self.marker_size, 1000, 3)))
 
-            if entity.is_missile:
-                if self.show_markers:
-                    self._draw_missile(entity, position)
+        # 半透明的爆炸和轨迹最后绘制，只做深度测试不写深度，避免互相遮挡
+        GL.glDepthMask(GL.GL_FALSE)
+        self._draw_explosions(explosions, explosion_positions)
 
-                if self.show_trails and len(entity.trajectory) > 1:
-                    self._draw_entity_trail(entity)
+        # 所有导弹和飞机的轨迹一次绘制
+        if self.show_trails:
+            self._draw_trails([entity for entity in missiles + aircraft if entity.n_points > 1])
+        GL.glDepthMask(GL.GL_TRUE)
 
-        # 最后绘制飞机
-        for entity_id, data in current_entities.items():
-            entity = data['entity']
-            position = data['position']
+    def _draw_markers(self, groups):
+        """
+        批量绘制各类实体的标记（点和十字），所有类别共用一次点绘制和一次线绘制
 
-            if entity.is_aircraft:
-                if self.show_markers:
-                    self._draw_aircraft(entity, position)
+        参数:
+        groups: 各类别的(实体列表, 位置列表, 默认颜色, 点大小, 十字半长（米）, 十字轴数)，
+                未设置颜色的实体使用默认颜色；轴数为2时画水平十字，为3时额外包含高度线
+        """
+        groups = [group for group in groups if group[0]]
+        if not groups:
+            return
 
-                if self.show_trails and len(entity.trajectory) > 1:
-                    self._draw_entity_trail(entity)
+        point_count = sum(len(group[0]) for group in groups)
+        line_count = sum(len(group[0]) * group[5] * 2 for group in groups)
+        vertices = np.empty(point_count + line_count, dtype=_MARKER_VERTEX)
 
-    def _draw_aircraft(self, entity, position):
-        """绘制飞机标记"""
-        # 设置实体颜色
-        if entity.color:
-            GL.glColor3f(*entity.color)
-        else:
-            GL.glColor3f(1.0, 1.0, 1.0)  # 默认白色
+        # 先存放所有点，再存放所有十字顶点
+        point_offset, line_offset = 0, point_count
+        for entities, positions, default_color, point_size, line_size, axes in groups:
+            count = len(entities)
+            points = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+            colors = np.ones((count, 4), dtype=np.float32)
+            colors[:, :3] = [entity.color or default_color for entity in entities]
 
-        # 绘制点
-        GL.glPointSize(self.marker_size)
-        GL.glBegin(GL.GL_POINTS)
-        GL.glVertex3f(position[0], position[1], position[2])
-        GL.glEnd()
-
-        # 绘制简单模型（十字形）
-        line_size = 1000  # 十字大小
-        GL.glBegin(GL.GL_LINES)
-        # 水平线
-        GL.glVertex3f(position[0] - line_size, position[1], position[2])
-        GL.glVertex3f(position[0] + line_size, position[1], position[2])
-        # 垂直线
-        GL.glVertex3f(position[0], position[1] - line_size, position[2])
-        GL.glVertex3f(position[0], position[1] + line_size, position[2])
-        # 高度线
-        GL.glVertex3f(position[0], position[1], position[2] - line_size)
-        GL.glVertex3f(position[0], position[1], position[2] + line_size)
-        GL.glEnd()
-
-    def _draw_missile(self, entity, position):
-        """绘制导弹标记"""
-        # 设置实体颜色
-        if entity.color:
-            GL.glColor3f(*entity.color)
-        else:
-            GL.glColor3f(1.0, 0.5, 0.0)  # 默认橙色
+            # 每个标记沿各轴生成一条线段：(实体, 轴, 端点, 坐标)
+            offsets = np.eye(3, dtype=np.float32)[:axes] * line_size
+            lines = (points[:, None, None, :]
+                     + offsets[None, :, None, :] * np.array([-1, 1], dtype=np.float32)[None, None, :, None])
+
+            point_vertices = vertices[point_offset:point_offset + count]
+            point_vertices['position'] = points
+            point_vertices['color'] = colors
+            point_vertices['size'] = point_size
+
+            line_vertices = vertices[line_offset:line_offset + count * axes * 2]
+            line_vertices['position'] = lines.reshape(-1, 3)
+            line_vertices['color'] = np.repeat(colors, axes * 2, axis=0)
+            line_vertices['size'] = point_size
+
+            point_offset += count
+            line_offset += count * axes * 2
+
+        self._upload_stream(self._marker_vbo, vertices)
+
+        GL.glBindVertexArray(self._marker_vao)
 
         # 绘制点
-        GL.glPointSize(self.marker_size * 0.8)  # 导弹点略小
-        GL.glBegin(GL.GL_POINTS)
-        GL.glVertex3f(position[0], position[1], position[2])
-        GL.glEnd()
-
-        # 绘制简单模型（小十字）
-        line_size = 500  # 导弹十字略小
-        GL.glBegin(GL.GL_LINES)
-        # 水平线
-        GL.glVertex3f(position[0] - line_size, position[1], position[2])
-        GL.glVertex3f(position[0] + line_size, position[1], position[2])
-        # 垂直线
-        GL.glVertex3f(position[0], position[1] - line_size, position[2])
-        GL.glVertex3f(position[0], position[1] + line_size, position[2])
-        GL.glEnd()
-
-    def _draw_explosion(self, entity, position):
-        """绘制爆炸效果"""
-        # 设置爆炸颜色（半透明橙黄色）
+        GL.glDrawArrays(GL.GL_POINTS, 0, point_count)
+
+        # 绘制十字
+        GL.glDrawArrays(GL.GL_LINES, point_count, line_count)
+
+    def _draw_explosions(self, entities, positions):
+        """
+        绘制爆炸效果（所有爆炸实例化为一次绘制）
+
+        参数:
+        entities: 爆炸实体列表
+        positions: 与实体对应的位置列表
+        """
+        if not entities:
+            return
+
+        # 爆炸颜色（半透明橙黄色）
         explosion_color = (1.0, 0.7, 0.0, 0.6)  # RGBA
 
-        if entity.color:
-            GL.glColor4f(entity.color[0], entity.color[1], entity.color[2], 0.6)
-        else:
-            GL.glColor4f(*explosion_color)
+        instances = np.empty((len(entities), 8), dtype=np.float32)
+        instances[:, :3] = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        instances[:, 3] = [entity.radius for entity in entities]
+        instances[:, 4:] = [(entity.color[0], entity.color[1], entity.color[2], 0.6)
+                            if entity.color else explosion_color for entity in entities]
+
+        # 按到相机的距离从远到近排序，保证混合顺序正确
+        if len(entities) > 1:
+            offsets = instances[:, :3] - np.array(self._camera_pos, dtype=np.float32)
+            instances = instances[np.argsort(-np.einsum('ij,ij->i', offsets, offsets))]
+        self._upload_stream(self._explosion_vbo, instances)
+
+        # 单位球体按实例缩放到爆炸半径并平移到爆炸位置
+        # 不写深度时只画正面，避免背面叠加使球体变得更不透明
+        GL.glEnable(GL.GL_CULL_FACE)
+        GL.glBindVertexArray(self._sphere_vao)
+        GL.glDrawElementsInstanced(GL.GL_TRIANGLES, self._sphere_index_count, GL.GL_UNSIGNED_INT,
+                                   None, len(entities))
+        GL.glDisable(GL.GL_CULL_FACE)
+
+    def _update_trail_buffer(self):
+        """将所有实体的轨迹点（位置+颜色+时间）上传到共享顶点缓冲（仅在数据变化时）"""
+        self.data_engine.pack_trajectories()
+        if self._trail_vbo_generation == self.data_engine.packed_generation:
+            return
 
-        # 获取爆炸半径
-        radius = entity.radius
+        positions = self.data_engine.all_positions
+        if positions is None:
+            vertices = np.empty(0, dtype=_TRAIL_VERTEX)
+        else:
+            vertices = np.empty(len(positions), dtype=_TRAIL_VERTEX)
+            vertices['position'] = positions
+            vertices['time'] = self.data_engine.all_times
+            for entity_id, entity_slice in self.data_engine.entity_slices.items():
+                vertices['color'][entity_slice] = self._trail_color(self.data_engine.entities[entity_id])
+        self._trail_colors = vertices['color']  # 供两端线段取色
 
-        # 绘制爆炸球体
-        quadric = GLU.gluNewQuadric()
-        GLU.gluQuadricDrawStyle(quadric, GLU.GLU_FILL)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._trail_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
 
-        # 绘制半透明球体
-        GL.glPushMatrix()
-        GL.glTranslatef(position[0], position[1], position[2])
-        GLU.gluSphere(quadric, radius, 20, 20)  # 20个经度和纬度细分
-        GL.glPopMatrix()
+        self._trail_vbo_generation = self.data_engine.packed_generation
 
-        # 释放二次曲面对象
-        GLU.gluDeleteQuadric(quadric)
+    def _draw_trails(self, entities):
+        """
+        绘制一组实体的轨迹
 
-    def _draw_entity_trail(self, entity):
-        """绘制实体轨迹"""
-        if not entity.trajectory or not self.data_engine.current_time:
+        参数:
+        entities: 需要绘制轨迹的实体列表
+        """
+        current_time = self.data_engine.current_time
+        if not entities or current_time is None:
             return
 
-        # 找到当前时间对应的轨迹点索引
-        current_idx = 0
-        for i, timestamp in enumerate(entity.timestamps):
-            if timestamp <= self.data_engine.current_time:
-                current_idx = i
-            else:
-                break
+        # 暂停时（如旋转视角）复用上一帧的结果，两端线段也无需重新上传
+        key = (current_time, self.trail_length, self.data_engine.packed_generation,
+               tuple(entity.id for entity in entities))
+        if key != self._trail_frame_key:
+            self._trail_frame = self._build_trails(entities, current_time)
+            self._trail_frame_key = key
+            if self._trail_frame is not None:
+                self._upload_stream(self._trail_end_vbo, self._trail_frame[2])
 
-        # 如果没有足够的轨迹点，返回
-        if current_idx < 1:
+        if self._trail_frame is None:
             return
+        firsts, counts, end_vertices = self._trail_frame
 
-        # 计算轨迹起始时间
-        trail_start_time = self.data_engine.current_time - self.trail_length
+        # 从轨迹起点到当前时间渐显
+        GL.glUniform1f(self._fade_start_location, current_time - self.trail_length)
+        GL.glUniform1f(self._fade_scale_location, 1.0 / self.trail_length)
 
-        # 找到轨迹点的起始索引（从当前时间往回推）
-        start_idx = 0
-        for i in range(current_idx, -1, -1):
-            if entity.timestamps[i] <= trail_start_time:
-                start_idx = i + 1  # 保留下一个点以确保连续性
-                break
+        # 区间内的轨迹点直接从共享顶点缓冲绘制
+        GL.glBindVertexArray(self._trail_vao)
+        GL.glMultiDrawArrays(GL.GL_LINE_STRIP, firsts, counts, len(firsts))
 
-        # 确保不会超出边界
-        start_idx = max(0, start_idx)
+        # 两端连接到插值得到的起点和当前点
+        GL.glBindVertexArray(self._trail_end_vao)
+        GL.glDrawArrays(GL.GL_LINES, 0, len(end_vertices))
 
-        # 如果轨迹点不足，返回
-        if start_idx >= current_idx:
-            return
+        GL.glUniform1f(self._fade_scale_location, 0.0)
 
-        # 设置轨迹颜色（半透明）
+    def _trail_color(self, entity):
+        """轨迹颜色（半透明RGBA，按0-255量化）"""
         alpha = 0.7  # 轨迹透明度
         if entity.is_missile:
             alpha = 0.5  # 导弹轨迹更透明
 
-        if entity.color:
-            GL.glColor4f(entity.color[0], entity.color[1], entity.color[2], alpha)
-        else:
-            GL.glColor4f(1.0, 1.0, 1.0, alpha)  # 默认白色半透明
+        color = entity.color or (1.0, 1.0, 1.0)  # 默认白色半透明
+        return np.rint(np.array([color[0], color[1], color[2], alpha]) * 255).astype(np.uint8)
+
+    def _build_trails(self, entities, current_time):
+        """
+        计算一组实体轨迹的绘制范围
+
+        返回:
+        (firsts, counts, end_vertices)：firsts和counts为各轨迹点区间在共享顶点缓冲中的范围，
+        end_vertices为两端插值线段的顶点（每条轨迹4个）；没有可绘制的轨迹时返回None
+        """
+        valid, first, last, head, tail, head_time = self.data_engine.get_trails(
+            entities, current_time - self.trail_length, current_time)
+        if not len(first):
+            return None
 
-        # 绘制轨迹线（只绘制到当前时间点）
-        GL.glBegin(GL.GL_LINE_STRIP)
-        for i in range(start_idx, current_idx + 1):
-            point = entity.trajectory[i]
-            position = point['position']
-            GL.glVertex3f(position[0], position[1], position[2])
-        GL.glEnd()
+        times = self.data_engine.all_times
+        positions = self.data_engine.all_positions
+
+        # 两端插值线段：起点→第一个轨迹点，最后一个轨迹点→当前点
+        end_vertices = np.empty((len(first), 4), dtype=_TRAIL_VERTEX)
+        end_vertices['position'] = np.stack((head, positions[first], positions[last], tail), axis=1)
+        end_vertices['color'] = self._trail_colors[first][:, None]
+        end_vertices['time'] = np.stack(
+            (head_time, times[first], times[last], np.full(len(first), current_time)), axis=1)
+
+        return (first.astype(np.int32), (last - first + 1).astype(np.int32),
+                end_vertices.reshape(-1))
 
     def _draw_time_info(self):
         """绘制时间信息（这里省略，因为在主窗口中已有时间显示）"""
@@ -347,6 +657,9 @@ class ViewControl(QOpenGLWidget):
 
     def mouseMoveEvent(self, event):
         """处理鼠标移动事件"""
+        # 未按键的悬停移动不改变视图，无需重绘
+        if event.buttons() == Qt.NoButton:
+            return
         if not self.last_pos:
             self.last_pos = event.pos()
             return
@@ -365,6 +678,7 @@ class ViewControl(QOpenGLWidget):
 
             # 规范化方位角
             self.camera_azimuth %= 360
+            self._camera_dirty = True
 
         # 右键拖动：平移相机
         elif event.buttons() & Qt.RightButton:
@@ -380,16 +694,19 @@ class ViewControl(QOpenGLWidget):
             pan_factor = self.camera_distance * 0.001
 
             # 更新相机目标点
-            self.camera_target[0] -= x_offset * pan_factor
-            self.camera_target[1] -= y_offset * pan_factor
+            self.camera_target_x -= x_offset * pan_factor
+            self.camera_target_y -= y_offset * pan_factor
+            self._camera_dirty = True
 
         self.last_pos = event.pos()
-        self.update()  # 更新视图
+        if self._camera_dirty:
+            self.update()  # 更新视图
 
     def wheelEvent(self, event):
         """处理鼠标滚轮事件（缩放）"""
         zoom_factor = 1.0 - event.angleDelta().y() * 0.001 * self.zoom_sensitivity
         self.camera_distance *= zoom_factor
+        self._camera_dirty = True
 
         # 限制缩放范围
         self.camera_distance = max(1000, min(1000000, self.camera_distance))
@@ -424,6 +741,7 @@ class ViewControl(QOpenGLWidget):
             self.is_playing = False
         else:
             # 100ms刷新一次（10fps）
+            self._play_clock.start()
             self.play_timer.start(100)
             self.is_playing = True
 
@@ -432,18 +750,19 @@ class ViewControl(QOpenGLWidget):
         推进时间
 
         参数:
-        seconds: 如果指定，则前进指定的秒数；否则根据播放速度前进
+        seconds: 如果指定，则前进指定的秒数；否则根据实际经过的时间和播放速度前进
         """
         if seconds is None:
-            # 根据播放速度计算时间增量（默认每帧0.1秒）
-            seconds = 0.1 * self.play_speed
+            # 按实际经过的时间推进，绘制较慢时播放速度不受影响（单次最多1秒，避免跳跃）
+            elapsed = min(self._play_clock.restart() / 1000.0, 1.0)
+            seconds = elapsed * self.play_speed
 
-        if self.data_engine.current_time:
+        if self.data_engine.current_time is not None:
             self.data_engine.advance_time(seconds)
 
             # 检查是否到达结束时间
             start_time, end_time = self.data_engine.get_time_range()
-            if end_time and self.data_engine.current_time > end_time:
+            if end_time is not None and self.data_engine.current_time > end_time:
                 self.data_engine.set_time(start_time)  # 循环播放
 
             self.update()  # 更新视图
@@ -453,7 +772,17 @@ class ViewControl(QOpenGLWidget):
         self.camera_distance = 100000
         self.camera_azimuth = 0
         self.camera_elevation = 45
-        self.camera_target = np.array([0., 0., 0.])
+        self.camera_target_x = 0.0
+        self.camera_target_y = 0.0
+        self.camera_target_z = 0.0
+        self._camera_dirty = True
+        self.update()
+
+    def set_data_engine(self, data_engine):
+        """切换数据引擎（如打开新文件后）"""
+        self.data_engine = data_engine
+        self._trail_frame_key = None
+        self._trail_vbo_generation = -1
         self.update()
 
     def set_play_speed(self, speed):
@@ -462,7 +791,7 @@ class ViewControl(QOpenGLWidget):
 
     def set_trail_length(self, seconds):
         """设置轨迹长度（秒）"""
-        self.trail_length = timedelta(seconds=seconds)
+        self.trail_length = float(seconds)
         self.update()
 
     def toggle_trails(self, show):
@@ -478,5 +807,55 @@ class ViewControl(QOpenGLWidget):
     def set_marker_size(self, size):
         """设置标记大小"""
         self.marker_size = size
-        GL.glPointSize(size)
-        self.update()
\ No newline at end of file
+        self.update()
+
+
+def _perspective(fov, aspect, near, far):
+    """透视投影矩阵（与gluPerspective相同）"""
+    f = 1.0 / math.tan(math.radians(fov) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def _look_at(eye, target, up):
+    """视图矩阵（与gluLookAt相同）"""
+    eye = np.asarray(eye, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    upward = np.cross(side, forward)
+
+    view = np.identity(4)
+    view[0, :3] = side
+    view[1, :3] = upward
+    view[2, :3] = -forward
+    view[:3, 3] = -view[:3, :3] @ eye
+    return view
+
+
+def _unit_sphere(slices, stacks):
+    """
+    生成单位球体的三角形网格
+
+    返回:
+    (vertices, indices)：顶点数组（float32，M×3）和三角形索引数组（uint32）
+    """
+    theta = np.linspace(0, np.pi, stacks + 1)
+    phi = np.linspace(0, 2 * np.pi, slices + 1)
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    vertices = np.stack((np.sin(theta) * np.cos(phi),
+                         np.sin(theta) * np.sin(phi),
+                         np.cos(theta)), axis=-1).reshape(-1, 3).astype(np.float32)
+
+    # 每个经纬网格由两个三角形组成
+    ring = slices + 1
+    i, j = np.meshgrid(np.arange(stacks), np.arange(slices), indexing='ij')
+    a = (i * ring + j).ravel()
+    b = a + ring
+    indices = np.stack((a, b, a + 1, a + 1, b, b + 1), axis=-1).ravel().astype(np.uint32)
+    return vertices, indices